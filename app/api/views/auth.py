@@ -67,6 +67,11 @@ def auth_login():
         if not user.enable_otp:
             return jsonify(error="Currently we don't support FIDO on mobile yet"), 403
 
+    if user.password_needs_rehash():
+        LOG.d("re-hash %s password", user)
+        user.set_password(password)
+        db.session.commit()
+
     return jsonify(**auth_payload(user, device)), 200
 
 
@@ -6,7 +6,7 @@ from wtforms import StringField, validators
 from app.auth.base import auth_bp
 from app.auth.views.login_utils import after_login
 from app.utils import sanitize_email
-from app.extensions import limiter
+from app.extensions import db, limiter
 from app.log import LOG
 from app.models import User
 
@@ -49,6 +49,11 @@ def login():
                 "error",
             )
         else:
+            if user.password_needs_rehash():
+                LOG.d("re-hash %s password", user)
+                user.set_password(form.password.data)
+                db.session.commit()
+
             return after_login(user, next_url)
 
     return render_template(
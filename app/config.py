@@ -69,6 +69,15 @@ except Exception:
 # maximum number of directory a premium user can create
 MAX_NB_DIRECTORY = 50
 
+# bcrypt cost factor used to hash passwords, i.e. 2^BCRYPT_COST rounds
+# passwords hashed with another cost are re-hashed at the next successful login
+BCRYPT_COST = int(os.environ.get("BCRYPT_COST", 12))
+# bcrypt only accepts a cost between 4 and 31
+if not 4 <= BCRYPT_COST <= 31:
+    raise ValueError(f"BCRYPT_COST must be between 4 and 31, got {BCRYPT_COST}")
+if BCRYPT_COST < 10:
+    print("WARNING: BCRYPT_COST is below 10, passwords are weakly hashed")
+
 # transactional email sender
 SENDER = os.environ.get("SENDER")
 
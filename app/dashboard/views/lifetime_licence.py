@@ -33,9 +33,16 @@ def lifetime_licence():
     if coupon_form.validate_on_submit():
         code = coupon_form.code.data
 
-        coupon: LifetimeCoupon = LifetimeCoupon.get_by(code=code)
-        if coupon and coupon.nb_used > 0:
-            coupon.nb_used -= 1
+        # decrement nb_used in the database directly
+        # so concurrent requests can't use the coupon more than nb_used times
+        nb_updated = LifetimeCoupon.query.filter(
+            LifetimeCoupon.code == code, LifetimeCoupon.nb_used > 0
+        ).update(
+            {LifetimeCoupon.nb_used: LifetimeCoupon.nb_used - 1},
+            synchronize_session=False,
+        )
+        if nb_updated:
+            coupon: LifetimeCoupon = LifetimeCoupon.get_by(code=code)
             current_user.lifetime = True
             if coupon.paid:
                 current_user.paid_lifetime = True
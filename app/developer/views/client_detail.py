@@ -89,9 +89,8 @@ def client_detail_oauth_setting(client_id):
     if form.validate_on_submit():
         uris = request.form.getlist("uri")
 
-        # replace all uris. TODO: optimize this?
-        for redirect_uri in client.redirect_uris:
-            RedirectUri.delete(redirect_uri.id)
+        # replace all uris
+        RedirectUri.filter_by(client_id=client.id).delete()
 
         for uri in uris:
             RedirectUri.create(client_id=client_id, uri=uri)
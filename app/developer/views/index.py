@@ -34,5 +34,6 @@ def index():
         return redirect(url_for("developer.index"))
 
     clients = Client.filter_by(user_id=current_user.id).all()
+    nb_users = Client.nb_users_for([client.id for client in clients])
 
-    return render_template("developer/index.html", clients=clients)
+    return render_template("developer/index.html", clients=clients, nb_users=nb_users)
@@ -1,20 +1,28 @@
 import enum
+import hashlib
+import hmac
 import random
+import secrets
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from email.utils import formataddr
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Dict
 
 import arrow
 import bcrypt
 from arrow import Arrow
 from flask import url_for
 from flask_login import UserMixin
-from sqlalchemy import text, desc, CheckConstraint
+from sqlalchemy import text, desc, CheckConstraint, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import deferred
 from sqlalchemy_utils import ArrowType
 
 from app import s3
 from app.config import (
+    BCRYPT_COST,
     MAX_NB_EMAIL_FREE_PLAN,
     URL,
     AVATAR_URL_EXPIRATION,
@@ -83,6 +91,14 @@ class ModelMixin(object):
             db.session.commit()
         return r
 
+    @classmethod
+    def bulk_create(cls, rows: List[dict]):
+        """insert rows, each row being a dict of column values.
+        Much faster than create() for a large number of rows as the ORM unit of work is bypassed:
+        no object is returned or added to the session, relationships and ORM events are ignored.
+        """
+        db.session.bulk_insert_mappings(cls, rows)
+
     def save(self):
         db.session.add(self)
 
@@ -175,6 +191,49 @@ class Fido(db.Model, ModelMixin):
     name = db.Column(db.String(128), nullable=False, unique=False)
 
 
+# bcrypt is deliberately slow: remember the passwords that have been verified recently
+# so repeated logins (API, browser extension, sudo mode, etc) don't redo the key schedule.
+# The password is only kept as an HMAC under a per-process secret, so a memory dump
+# doesn't give away fast-to-crack digests, and the stored hash is part of the key,
+# so an entry becomes unreachable as soon as the password is changed.
+_VERIFIED_PASSWORD_CACHE_SIZE = 1024
+_VERIFIED_PASSWORD_CACHE_TTL = 300  # seconds
+_CACHE_SECRET = secrets.token_bytes(32)
+_verified_passwords = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+
+
+def _verify_password(password: str, salt: str, password_hash: str) -> bool:
+    password = password.encode()
+    key = (
+        salt,
+        hmac.new(_CACHE_SECRET, password, hashlib.sha256).digest(),
+        password_hash,
+    )
+    now = time.monotonic()
+    with _verified_passwords_lock:
+        verified_at = _verified_passwords.get(key)
+        if verified_at is not None:
+            if now - verified_at < _VERIFIED_PASSWORD_CACHE_TTL:
+                _verified_passwords.move_to_end(key)
+                return True
+            del _verified_passwords[key]
+
+    # constant-time comparison to avoid timing attacks
+    if not hmac.compare_digest(
+        bcrypt.hashpw(password, salt.encode()), password_hash.encode()
+    ):
+        return False
+
+    with _verified_passwords_lock:
+        _verified_passwords[key] = now
+        _verified_passwords.move_to_end(key)
+        while len(_verified_passwords) > _VERIFIED_PASSWORD_CACHE_SIZE:
+            _verified_passwords.popitem(last=False)
+
+    return True
+
+
 class User(db.Model, ModelMixin, UserMixin):
     __tablename__ = "users"
     email = db.Column(db.String(256), unique=True, nullable=False)
@@ -438,10 +497,11 @@ class User(db.Model, ModelMixin, UserMixin):
         - in trial period or
         - active subscription
         """
-        if self._lifetime_or_active_subscription():
+        # check the trial period first as it doesn't require any subscription lookup
+        if self.trial_end and arrow.now() < self.trial_end:
             return True
 
-        if self.trial_end and arrow.now() < self.trial_end:
+        if self._lifetime_or_active_subscription():
             return True
 
         return False
@@ -479,10 +539,17 @@ class User(db.Model, ModelMixin, UserMixin):
         if self.is_premium():
             return True
 
-        return Alias.filter_by(user_id=self.id).count() < MAX_NB_EMAIL_FREE_PLAN
+        # no need to count all aliases: check if the MAX_NB_EMAIL_FREE_PLAN-th alias exists
+        return (
+            Alias.query.with_entities(Alias.id)
+            .filter_by(user_id=self.id)
+            .offset(MAX_NB_EMAIL_FREE_PLAN - 1)
+            .first()
+            is None
+        )
 
     def set_password(self, password):
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=BCRYPT_COST)
         password_hash = bcrypt.hashpw(password.encode(), salt).decode()
         self.salt = salt.decode()
         self.password = password_hash
@@ -490,8 +557,14 @@ class User(db.Model, ModelMixin, UserMixin):
     def check_password(self, password) -> bool:
         if not self.password:
             return False
-        password_hash = bcrypt.hashpw(password.encode(), self.salt.encode())
-        return self.password.encode() == password_hash
+
+        return _verify_password(password, self.salt, self.password)
+
+    def password_needs_rehash(self) -> bool:
+        """whether the password has been hashed with another cost than BCRYPT_COST.
+        If so, it's re-hashed with set_password() at the next successful login"""
+        # the salt looks like $2b$12$..., 12 being the cost used to hash the password
+        return int(self.salt[4:6]) != BCRYPT_COST
 
     def profile_picture_url(self):
         if self.profile_picture_id:
@@ -742,19 +815,18 @@ class SocialAuth(db.Model, ModelMixin):
 # <<< OAUTH models >>>
 
 
-def generate_oauth_client_id(client_name) -> str:
-    oauth_client_id = convert_to_id(client_name) + "-" + random_string()
+# avoid infinite loop when inserting a randomly generated unique value
+_MAX_GENERATE_ATTEMPTS = 5
 
-    # check that the client does not exist yet
-    if not Client.get_by(oauth_client_id=oauth_client_id):
-        LOG.debug("generate oauth_client_id %s", oauth_client_id)
-        return oauth_client_id
 
-    # Rerun the function
-    LOG.warning(
-        "client_id %s already exists, generate a new client_id", oauth_client_id
-    )
-    return generate_oauth_client_id(client_name)
+def generate_oauth_client_id(client_name) -> str:
+    """generate a oauth_client_id candidate.
+    Its uniqueness is guaranteed by the unique constraint when the client is inserted,
+    cf Client.create_new()
+    """
+    oauth_client_id = convert_to_id(client_name) + "-" + random_string()
+    LOG.debug("generate oauth_client_id %s", oauth_client_id)
+    return oauth_client_id
 
 
 class MfaBrowser(db.Model, ModelMixin):
@@ -805,31 +877,70 @@ class Client(db.Model, ModelMixin):
     published = db.Column(db.Boolean, default=False, nullable=False)
 
     # user who created this client
-    user_id = db.Column(db.ForeignKey(User.id, ondelete="cascade"), nullable=False)
+    user_id = db.Column(
+        db.ForeignKey(User.id, ondelete="cascade"), nullable=False, index=True
+    )
     icon_id = db.Column(db.ForeignKey(File.id), nullable=True)
 
     icon = db.relationship(File)
 
+    redirect_uris = db.relationship("RedirectUri", back_populates="client")
+
     def nb_user(self):
         return ClientUser.filter_by(client_id=self.id).count()
 
-    def get_scopes(self) -> [Scope]:
-        # todo: client can choose which scopes they want to have access
-        return [Scope.NAME, Scope.EMAIL, Scope.AVATAR_URL]
+    @classmethod
+    def nb_users_for(cls, client_ids: List[int]) -> Dict[int, int]:
+        """return the number of users of each client using a single query.
+        Clients without user are absent from the result.
+        """
+        if not client_ids:
+            return {}
+
+        rows = (
+            db.session.query(ClientUser.client_id, func.count(ClientUser.id))
+            .filter(ClientUser.client_id.in_(client_ids))
+            .group_by(ClientUser.client_id)
+            .all()
+        )
+        return dict(rows)
+
+    # todo: client can choose which scopes they want to have access
+    DEFAULT_SCOPES = (Scope.NAME, Scope.EMAIL, Scope.AVATAR_URL)
+
+    def get_scopes(self) -> Tuple[Scope, ...]:
+        return self.DEFAULT_SCOPES
 
     @classmethod
     def create_new(cls, name, user_id) -> "Client":
-        # generate a client-id
-        oauth_client_id = generate_oauth_client_id(name)
         oauth_client_secret = random_string(40)
-        client = Client.create(
-            name=name,
-            oauth_client_id=oauth_client_id,
-            oauth_client_secret=oauth_client_secret,
-            user_id=user_id,
-        )
 
-        return client
+        for _ in range(_MAX_GENERATE_ATTEMPTS):
+            # generate a client-id, rely on the unique constraint to detect collision
+            oauth_client_id = generate_oauth_client_id(name)
+            try:
+                with db.session.begin_nested():
+                    client = Client.create(
+                        name=name,
+                        oauth_client_id=oauth_client_id,
+                        oauth_client_secret=oauth_client_secret,
+                        user_id=user_id,
+                    )
+            except IntegrityError as e:
+                # only a client_id collision is worth a retry
+                if not Client.get_by(oauth_client_id=oauth_client_id):
+                    raise
+
+                LOG.warning(
+                    "client_id %s already exists, generate a new client_id",
+                    oauth_client_id,
+                )
+                error = e
+                continue
+
+            return client
+
+        raise error
 
     def get_icon_url(self):
         if self.icon_id:
@@ -851,10 +962,12 @@ class Client(db.Model, ModelMixin):
 class RedirectUri(db.Model, ModelMixin):
     """Valid redirect uris for a client"""
 
-    client_id = db.Column(db.ForeignKey(Client.id, ondelete="cascade"), nullable=False)
+    client_id = db.Column(
+        db.ForeignKey(Client.id, ondelete="cascade"), nullable=False, index=True
+    )
     uri = db.Column(db.String(1024), nullable=False)
 
-    client = db.relationship(Client, backref="redirect_uris")
+    client = db.relationship(Client, back_populates="redirect_uris")
 
 
 class AuthorizationCode(db.Model, ModelMixin):
@@ -902,7 +1015,8 @@ def generate_email(
     in_hex: bool = False,
     alias_domain=FIRST_ALIAS_DOMAIN,
 ) -> str:
-    """generate an email address that does not exist before
+    """generate an email address candidate.
+    Its uniqueness is checked when the alias is inserted, cf Alias.create_new_random()
     :param alias_domain: the domain used to generate the alias.
     :param scheme: int, value of AliasGeneratorEnum, indicate how the email is generated
     :type in_hex: bool, if the generate scheme is uuid, is hex favorable?
@@ -914,17 +1028,8 @@ def generate_email(
         random_email = random_words() + "@" + alias_domain
 
     random_email = random_email.lower().strip()
-
-    # check that the client does not exist yet
-    if not Alias.get_by(email=random_email) and not DeletedAlias.get_by(
-        email=random_email
-    ):
-        LOG.debug("generate email %s", random_email)
-        return random_email
-
-    # Rerun the function
-    LOG.warning("email %s already exists, generate a new email", random_email)
-    return generate_email(scheme=scheme, in_hex=in_hex)
+    LOG.debug("generate email %s", random_email)
+    return random_email
 
 
 class Alias(db.Model, ModelMixin):
@@ -939,7 +1044,7 @@ class Alias(db.Model, ModelMixin):
     enabled = db.Column(db.Boolean(), default=True, nullable=False)
 
     custom_domain_id = db.Column(
-        db.ForeignKey("custom_domain.id", ondelete="cascade"), nullable=True
+        db.ForeignKey("custom_domain.id", ondelete="cascade"), nullable=True, index=True
     )
 
     custom_domain = db.relationship("CustomDomain", foreign_keys=[custom_domain_id])
@@ -951,7 +1056,7 @@ class Alias(db.Model, ModelMixin):
 
     # to know whether an alias belongs to a directory
     directory_id = db.Column(
-        db.ForeignKey("directory.id", ondelete="cascade"), nullable=True
+        db.ForeignKey("directory.id", ondelete="cascade"), nullable=True, index=True
     )
 
     note = db.Column(db.Text, default=None, nullable=True)
@@ -1079,36 +1184,49 @@ class Alias(db.Model, ModelMixin):
         """create a new random alias"""
         custom_domain = None
 
-        random_email = None
+        alias_domain = FIRST_ALIAS_DOMAIN
 
         if user.default_alias_custom_domain_id:
             custom_domain = CustomDomain.get(user.default_alias_custom_domain_id)
-            random_email = generate_email(
-                scheme=scheme, in_hex=in_hex, alias_domain=custom_domain.domain
-            )
+            alias_domain = custom_domain.domain
         elif user.default_alias_public_domain_id:
             sl_domain: SLDomain = SLDomain.get(user.default_alias_public_domain_id)
             if sl_domain.premium_only and not user.is_premium():
                 LOG.warning("%s not premium, cannot use %s", user, sl_domain)
             else:
-                random_email = generate_email(
-                    scheme=scheme, in_hex=in_hex, alias_domain=sl_domain.domain
-                )
+                alias_domain = sl_domain.domain
 
-        if not random_email:
-            random_email = generate_email(scheme=scheme, in_hex=in_hex)
+        for _ in range(_MAX_GENERATE_ATTEMPTS):
+            random_email = generate_email(
+                scheme=scheme, in_hex=in_hex, alias_domain=alias_domain
+            )
+            try:
+                with db.session.begin_nested():
+                    alias = Alias.create(
+                        user_id=user.id,
+                        email=random_email,
+                        mailbox_id=user.default_mailbox_id,
+                        note=note,
+                        custom_domain_id=custom_domain.id if custom_domain else None,
+                    )
+            except AliasInTrashError as e:
+                LOG.warning("email %s is in trash, generate a new email", random_email)
+                error = e
+                continue
+            except IntegrityError as e:
+                # only an email collision is worth a retry
+                if not Alias.get_by(email=random_email):
+                    raise
 
-        alias = Alias.create(
-            user_id=user.id,
-            email=random_email,
-            mailbox_id=user.default_mailbox_id,
-            note=note,
-        )
+                LOG.warning(
+                    "email %s already exists, generate a new email", random_email
+                )
+                error = e
+                continue
 
-        if custom_domain:
-            alias.custom_domain_id = custom_domain.id
+            return alias
 
-        return alias
+        raise error
 
     def mailbox_email(self):
         if self.mailbox_id:
@@ -1135,7 +1253,9 @@ class ClientUser(db.Model, ModelMixin):
     )
 
     user_id = db.Column(db.ForeignKey(User.id, ondelete="cascade"), nullable=False)
-    client_id = db.Column(db.ForeignKey(Client.id, ondelete="cascade"), nullable=False)
+    client_id = db.Column(
+        db.ForeignKey(Client.id, ondelete="cascade"), nullable=False, index=True
+    )
 
     # Null means client has access to user original email
     alias_id = db.Column(db.ForeignKey(Alias.id, ondelete="cascade"), nullable=True)
@@ -1164,6 +1284,34 @@ class ClientUser(db.Model, ModelMixin):
         else:
             return self.user.name
 
+    def _name_info(self) -> str:
+        return self.name or self.user.name or ""
+
+    def _avatar_url_info(self) -> Optional[str]:
+        if not self.user.profile_picture_id:
+            return None
+
+        if self.default_avatar:
+            return URL + "/static/default-avatar.png"
+
+        return self.user.profile_picture.get_url(AVATAR_URL_EXPIRATION)
+
+    def _email_info(self) -> str:
+        # Use generated email
+        if self.alias_id:
+            LOG.debug("Use gen email for user %s, client %s", self.user, self.client)
+            return self.alias.email
+        # Use user original email
+        else:
+            return self.user.email
+
+    # how to get the user info for a scope, scopes absent here don't have user info
+    _USER_INFO_BY_SCOPE = {
+        Scope.NAME: _name_info,
+        Scope.AVATAR_URL: _avatar_url_info,
+        Scope.EMAIL: _email_info,
+    }
+
     def get_user_info(self) -> dict:
         """return user info according to client scope
         Return dict with key being scope name. For now all the fields are the same for all clients:
@@ -1186,31 +1334,9 @@ class ClientUser(db.Model, ModelMixin):
         }
 
         for scope in self.client.get_scopes():
-            if scope == Scope.NAME:
-                if self.name:
-                    res[Scope.NAME.value] = self.name or ""
-                else:
-                    res[Scope.NAME.value] = self.user.name or ""
-            elif scope == Scope.AVATAR_URL:
-                if self.user.profile_picture_id:
-                    if self.default_avatar:
-                        res[Scope.AVATAR_URL.value] = URL + "/static/default-avatar.png"
-                    else:
-                        res[Scope.AVATAR_URL.value] = self.user.profile_picture.get_url(
-                            AVATAR_URL_EXPIRATION
-                        )
-                else:
-                    res[Scope.AVATAR_URL.value] = None
-            elif scope == Scope.EMAIL:
-                # Use generated email
-                if self.alias_id:
-                    LOG.debug(
-                        "Use gen email for user %s, client %s", self.user, self.client
-                    )
-                    res[Scope.EMAIL.value] = self.alias.email
-                # Use user original email
-                else:
-                    res[Scope.EMAIL.value] = self.user.email
+            get_info = self._USER_INFO_BY_SCOPE.get(scope)
+            if get_info:
+                res[scope.value] = get_info(self)
 
         return res
 
@@ -1620,7 +1746,9 @@ class ApiKey(db.Model, ModelMixin):
 
 
 class CustomDomain(db.Model, ModelMixin):
-    user_id = db.Column(db.ForeignKey(User.id, ondelete="cascade"), nullable=False)
+    user_id = db.Column(
+        db.ForeignKey(User.id, ondelete="cascade"), nullable=False, index=True
+    )
     domain = db.Column(db.String(128), unique=True, nullable=False)
 
     # default name to use when user replies/sends from alias
@@ -1700,7 +1828,9 @@ class LifetimeCoupon(db.Model, ModelMixin):
 
 
 class Directory(db.Model, ModelMixin):
-    user_id = db.Column(db.ForeignKey(User.id, ondelete="cascade"), nullable=False)
+    user_id = db.Column(
+        db.ForeignKey(User.id, ondelete="cascade"), nullable=False, index=True
+    )
     name = db.Column(db.String(128), unique=True, nullable=False)
     # when a directory is disabled, new alias can't be created on the fly
     disabled = db.Column(db.Boolean, default=False, nullable=False, server_default="0")
@@ -27,6 +27,8 @@ with open(PADDLE_PUBLIC_KEY_PATH) as f:
 # Convert key from PEM to DER - Strip the first and last lines and newlines, and decode
 public_key_encoded = public_key[26:-25].replace("\n", "")
 public_key_der = base64.b64decode(public_key_encoded)
+# import the key once instead of at every webhook call
+_key = RSA.importKey(public_key_der)
 
 
 def verify_incoming_request(form_data: dict) -> bool:
@@ -50,10 +52,9 @@ def verify_incoming_request(form_data: dict) -> bool:
     serialized_data = phpserialize.dumps(sorted_data)
 
     # verify the data
-    key = RSA.importKey(public_key_der)
-    digest = SHA1.new()
-    digest.update(serialized_data)
-    verifier = PKCS1_v1_5.new(key)
+    # Paddle signs with SHA1, the digest algorithm can't be changed
+    digest = SHA1.new(serialized_data)
+    verifier = PKCS1_v1_5.new(_key)
     signature = base64.b64decode(signature)
     if verifier.verify(digest, signature):
         return True
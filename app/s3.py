@@ -20,6 +20,9 @@ if not LOCAL_FILE_UPLOAD:
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
         region_name=AWS_REGION,
     )
+    # creating a client is costly and get_url() is called for every avatar/icon rendered
+    # boto3 clients are thread-safe so the same client can be reused
+    _s3_client = _session.client("s3")
 
 
 def upload_from_bytesio(key: str, bs: BytesIO, content_type="string"):
@@ -70,8 +73,7 @@ def get_url(key: str, expires_in=3600) -> str:
     if LOCAL_FILE_UPLOAD:
         return URL + "/static/upload/" + key
     else:
-        s3_client = _session.client("s3")
-        return s3_client.generate_presigned_url(
+        return _s3_client.generate_presigned_url(
             ExpiresIn=expires_in,
             ClientMethod="get_object",
             Params={"Bucket": BUCKET, "Key": key},
@@ -1,4 +1,5 @@
 import random
+import secrets
 import string
 import urllib.parse
 
@@ -28,9 +29,10 @@ def random_words():
 
 
 def random_string(length=10):
-    """Generate a random string of fixed length """
+    """Generate a random string of fixed length.
+    Used for secrets like OAuth codes/tokens or API keys so use a CSPRNG"""
     letters = string.ascii_lowercase
-    return "".join(random.choice(letters) for _ in range(length))
+    return "".join(secrets.choice(letters) for _ in range(length))
 
 
 def convert_to_id(s: str):
@@ -7,6 +7,7 @@ import time
 
 import arrow
 import requests
+from sqlalchemy.exc import IntegrityError
 
 from app import s3
 from app.config import (
@@ -34,6 +35,9 @@ from app.models import (
 )
 from server import create_app
 
+# number of aliases looked up and inserted per query when importing aliases
+_BATCH_IMPORT_CHUNK_SIZE = 500
+
 
 # fix the database connection leak issue
 # use this method instead of create_app
@@ -125,6 +129,15 @@ def handle_batch_import(batch_import: BatchImport):
     lines = [line.decode() for line in r.iter_lines()]
     reader = csv.DictReader(lines)
 
+    # the user's verified domains, aliases can only be imported on these domains
+    custom_domains = {
+        cd.domain: cd
+        for cd in CustomDomain.filter_by(user_id=user.id, verified=True).all()
+    }
+
+    # alias email -> alias values, the aliases are inserted by chunk at the end
+    new_aliases = {}
+
     for row in reader:
         try:
             full_alias = sanitize_email(row["alias"])
@@ -134,25 +147,17 @@ def handle_batch_import(batch_import: BatchImport):
             continue
 
         alias_domain = get_email_domain_part(full_alias)
-        custom_domain = CustomDomain.get_by(domain=alias_domain)
+        custom_domain = custom_domains.get(alias_domain)
 
-        if (
-            not custom_domain
-            or not custom_domain.verified
-            or custom_domain.user_id != user.id
-        ):
+        if not custom_domain:
             LOG.debug("domain %s can't be used %s", alias_domain, user)
             continue
 
-        if (
-            Alias.get_by(email=full_alias)
-            or DeletedAlias.get_by(email=full_alias)
-            or DomainDeletedAlias.get_by(email=full_alias)
-        ):
+        if full_alias in new_aliases:
             LOG.d("alias already used %s", full_alias)
             continue
 
-        alias = Alias.create(
+        new_aliases[full_alias] = dict(
             user_id=user.id,
             email=full_alias,
             note=note,
@@ -160,8 +165,39 @@ def handle_batch_import(batch_import: BatchImport):
             custom_domain_id=custom_domain.id,
             batch_import_id=batch_import.id,
         )
+
+    emails = list(new_aliases)
+    for i in range(0, len(emails), _BATCH_IMPORT_CHUNK_SIZE):
+        chunk = emails[i : i + _BATCH_IMPORT_CHUNK_SIZE]
+        for model in (Alias, DeletedAlias, DomainDeletedAlias):
+            for (email,) in db.session.query(model.email).filter(
+                model.email.in_(chunk)
+            ):
+                LOG.d("alias already used %s", email)
+                new_aliases.pop(email, None)
+
+    rows = list(new_aliases.values())
+    nb_created = 0
+    for i in range(0, len(rows), _BATCH_IMPORT_CHUNK_SIZE):
+        chunk = rows[i : i + _BATCH_IMPORT_CHUNK_SIZE]
+        try:
+            with db.session.begin_nested():
+                Alias.bulk_create(chunk)
+            nb_created += len(chunk)
+        except IntegrityError:
+            # an alias has been created in the meantime: insert the chunk row by row
+            # so only the conflicting aliases are skipped
+            for alias_row in chunk:
+                try:
+                    with db.session.begin_nested():
+                        Alias.bulk_create([alias_row])
+                    nb_created += 1
+                except IntegrityError:
+                    LOG.d("alias already used %s", alias_row["email"])
+
         db.session.commit()
-        LOG.d("Create %s", alias)
+
+    LOG.d("Create %s aliases for %s", nb_created, batch_import)
 
 
 if __name__ == "__main__":
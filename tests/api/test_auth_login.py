@@ -1,5 +1,6 @@
 from flask import url_for
 
+from app import models
 from app.extensions import db
 from app.models import User, AccountActivation
 
@@ -27,6 +28,28 @@ def test_auth_login_success_mfa_disabled(flask_client):
     assert r.json["name"] == "Test User"
 
 
+def test_auth_login_rehash_password(flask_client, monkeypatch):
+    user = User.create(
+        email="abcd@gmail.com", password="password", name="Test User", activated=True
+    )
+    db.session.commit()
+    monkeypatch.setattr(models, "BCRYPT_COST", 5)
+
+    r = flask_client.post(
+        url_for("api.auth_login"),
+        json={
+            "email": "abcd@gmail.com",
+            "password": "password",
+            "device": "Test Device",
+        },
+    )
+
+    assert r.status_code == 200
+    # the password is re-hashed with the new cost
+    assert user.salt.startswith("$2b$05$")
+    assert user.check_password("password")
+
+
 def test_auth_login_success_mfa_enabled(flask_client):
     User.create(
         email="abcd@gmail.com",
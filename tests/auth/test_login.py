@@ -1,5 +1,6 @@
 from flask import url_for
 
+from app import models
 from app.extensions import db
 from app.models import User
 
@@ -39,3 +40,24 @@ def test_activated_user_login(flask_client):
 
     assert r.status_code == 200
     assert b"/auth/logout" in r.data
+
+
+def test_login_rehash_password(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c", password="password", name="Test User", activated=True
+    )
+    db.session.commit()
+    monkeypatch.setattr(models, "BCRYPT_COST", 5)
+
+    r = flask_client.post(
+        url_for("auth.login"),
+        data={"email": "a@b.c", "password": "password"},
+        follow_redirects=True,
+    )
+
+    assert r.status_code == 200
+    assert b"/auth/logout" in r.data
+
+    # the password is re-hashed with the new cost
+    assert user.salt.startswith("$2b$05$")
+    assert user.check_password("password")
@@ -11,9 +11,13 @@ os.environ["CONFIG"] = os.path.abspath(
 # need to set before importing any other module as DB_URI is init at import time
 os.environ["DB_URI"] = "sqlite://"
 
+import itertools
+
 import pytest
 
+from app import models
 from app.extensions import db
+from app.utils import random_words
 from server import create_app
 from init_app import add_sl_domains
 
@@ -51,3 +55,13 @@ def flask_client():
         db.create_all()
         add_sl_domains()
         yield client
+
+
+@pytest.fixture(autouse=True)
+def unique_random_words(monkeypatch):
+    """the test word list only has a few words: number the generated words
+    so random aliases don't collide more than the few allowed retries"""
+    counter = itertools.count()
+    monkeypatch.setattr(
+        models, "random_words", lambda: f"{random_words()}_{next(counter)}"
+    )
@@ -0,0 +1,54 @@
+from flask import url_for
+
+from app.models import LifetimeCoupon
+from tests.utils import login
+
+
+def test_use_coupon(flask_client):
+    user = login(flask_client)
+    LifetimeCoupon.create(code="coupon", nb_used=1, paid=True, commit=True)
+
+    r = flask_client.post(
+        url_for("dashboard.lifetime_licence"),
+        data={"code": "coupon"},
+        follow_redirects=True,
+    )
+
+    assert r.status_code == 200
+    assert b"You are upgraded to lifetime premium!" in r.data
+
+    assert user.lifetime
+    assert user.paid_lifetime
+    assert LifetimeCoupon.get_by(code="coupon").nb_used == 0
+
+
+def test_use_coupon_used_up(flask_client):
+    user = login(flask_client)
+    LifetimeCoupon.create(code="coupon", nb_used=0, commit=True)
+
+    r = flask_client.post(
+        url_for("dashboard.lifetime_licence"),
+        data={"code": "coupon"},
+        follow_redirects=True,
+    )
+
+    assert r.status_code == 200
+    assert b"Code *coupon* expired or invalid" in r.data
+
+    assert not user.lifetime
+    assert not user.paid_lifetime
+    assert LifetimeCoupon.get_by(code="coupon").nb_used == 0
+
+
+def test_use_coupon_unknown_code(flask_client):
+    user = login(flask_client)
+
+    r = flask_client.post(
+        url_for("dashboard.lifetime_licence"),
+        data={"code": "unknown"},
+        follow_redirects=True,
+    )
+
+    assert r.status_code == 200
+    assert b"Code *unknown* expired or invalid" in r.data
+    assert not user.lifetime
@@ -1,4 +1,7 @@
-from app.models import User
+from app import models
+from app.config import MAX_NB_EMAIL_FREE_PLAN
+from app.extensions import db
+from app.models import User, Alias
 
 
 def test_available_sl_domains(flask_client):
@@ -11,3 +14,91 @@ def test_available_sl_domains(flask_client):
     )
 
     assert set(user.available_sl_domains()) == {"d1.test", "d2.test", "sl.local"}
+
+
+def test_check_password(flask_client):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+
+    assert user.check_password("password")
+    # second call is served from the verified password cache
+    assert user.check_password("password")
+    assert not user.check_password("wrong password")
+
+    # the cached verification must not survive a password change
+    user.set_password("new password")
+    assert not user.check_password("password")
+    assert user.check_password("new password")
+
+
+def test_check_password_cache_expires(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    assert user.check_password("password")
+
+    # once the entry is too old, bcrypt runs again
+    monkeypatch.setattr(models, "_VERIFIED_PASSWORD_CACHE_TTL", 0)
+    calls = []
+    hashpw = models.bcrypt.hashpw
+    monkeypatch.setattr(
+        models.bcrypt, "hashpw", lambda *args: calls.append(args) or hashpw(*args)
+    )
+    assert user.check_password("password")
+    assert len(calls) == 1
+
+
+def test_can_create_new_alias(flask_client):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+    )
+    # make sure user is not in trial
+    user.trial_end = None
+    db.session.commit()
+
+    # the newsletter alias is created along with the user
+    for _ in range(MAX_NB_EMAIL_FREE_PLAN - 2):
+        Alias.create_new_random(user)
+    db.session.commit()
+    assert user.can_create_new_alias()
+
+    Alias.create_new_random(user)
+    db.session.commit()
+    assert not user.can_create_new_alias()
+
+
+def test_password_needs_rehash(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    assert user.salt.startswith("$2b$04$")
+    assert not user.password_needs_rehash()
+
+    monkeypatch.setattr(models, "BCRYPT_COST", 5)
+    assert user.password_needs_rehash()
+
+    # check_password() has no side effect
+    old_salt = user.salt
+    assert user.check_password("password")
+    assert user.salt == old_salt
+
+    user.set_password("password")
+    assert user.salt.startswith("$2b$05$")
+    assert not user.password_needs_rehash()
+    assert user.check_password("password")
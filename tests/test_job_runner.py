@@ -0,0 +1,75 @@
+import job_runner
+from app.extensions import db
+from app.models import (
+    User,
+    Alias,
+    BatchImport,
+    CustomDomain,
+    DeletedAlias,
+    File,
+)
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+
+    def iter_lines(self):
+        for line in self.content.splitlines():
+            yield line.encode()
+
+
+def test_handle_batch_import(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    custom_domain = CustomDomain.create(
+        user_id=user.id, domain="ab.cd", verified=True, commit=True
+    )
+    Alias.create(
+        user_id=user.id,
+        email="existing@ab.cd",
+        mailbox_id=user.default_mailbox_id,
+        custom_domain_id=custom_domain.id,
+        commit=True,
+    )
+    db.session.add(DeletedAlias(email="deleted@ab.cd"))
+    db.session.commit()
+
+    file = File.create(path="batch_import.csv", user_id=user.id, commit=True)
+    batch_import = BatchImport.create(user_id=user.id, file_id=file.id, commit=True)
+
+    csv_content = "\n".join(
+        [
+            "alias,note",
+            "first@ab.cd,first note",
+            "existing@ab.cd,already an alias",
+            "deleted@ab.cd,in the trash",
+            "first@ab.cd,duplicate in the file",
+            "second@ab.cd,",
+            "other@not-my-domain.com,unknown domain",
+        ]
+    )
+    monkeypatch.setattr(job_runner.s3, "get_url", lambda path: path)
+    monkeypatch.setattr(
+        job_runner.requests, "get", lambda url: FakeResponse(csv_content)
+    )
+
+    job_runner.handle_batch_import(batch_import)
+
+    assert batch_import.processed
+    assert batch_import.nb_alias() == 2
+
+    first = Alias.get_by(email="first@ab.cd")
+    assert first.note == "first note"
+    assert first.batch_import_id == batch_import.id
+    assert first.mailbox_id == user.default_mailbox_id
+    assert Alias.get_by(email="second@ab.cd").custom_domain_id == custom_domain.id
+
+    assert Alias.get_by(email="existing@ab.cd").batch_import_id is None
+    assert not Alias.get_by(email="deleted@ab.cd")
+    assert not Alias.get_by(email="other@not-my-domain.com")
@@ -1,9 +1,11 @@
 from uuid import UUID
 
 import pytest
+from sqlalchemy.exc import IntegrityError
 
 from app.config import EMAIL_DOMAIN, MAX_NB_EMAIL_FREE_PLAN
 from app.email_utils import parseaddr_unicode
+from app import models
 from app.extensions import db
 from app.models import (
     generate_email,
@@ -13,6 +15,9 @@ from app.models import (
     Mailbox,
     SenderFormatEnum,
     EnumE,
+    Client,
+    ClientUser,
+    DeletedAlias,
 )
 
 
@@ -217,3 +222,131 @@ def test_EnumE():
 
     assert E.get_value("A") == 100
     assert E.get_value("Not existent") is None
+
+
+def test_client_nb_users_for(flask_client):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    other_user = User.create(
+        email="b@c.d",
+        password="password",
+        name="Other User",
+        activated=True,
+        commit=True,
+    )
+    client1 = Client.create_new("client 1", user.id)
+    client2 = Client.create_new("client 2", user.id)
+    client3 = Client.create_new("client 3", user.id)
+    db.session.commit()
+
+    ClientUser.create(user_id=user.id, client_id=client1.id)
+    ClientUser.create(user_id=other_user.id, client_id=client1.id)
+    ClientUser.create(user_id=user.id, client_id=client2.id)
+    db.session.commit()
+
+    assert Client.nb_users_for([client1.id, client2.id, client3.id]) == {
+        client1.id: 2,
+        client2.id: 1,
+    }
+    assert Client.nb_users_for([]) == {}
+
+
+def test_bulk_create(flask_client):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+
+    Alias.bulk_create(
+        [
+            dict(
+                user_id=user.id,
+                email=f"{i}@sl.local",
+                mailbox_id=user.default_mailbox_id,
+            )
+            for i in range(3)
+        ]
+    )
+    db.session.commit()
+
+    for i in range(3):
+        alias = Alias.get_by(email=f"{i}@sl.local")
+        assert alias.user_id == user.id
+        # column defaults are applied
+        assert alias.created_at
+        assert alias.enabled
+
+
+def test_client_create_new_collision(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    monkeypatch.setattr(models, "random_string", lambda *args: "constant")
+
+    client = Client.create_new("Test Client", user.id)
+    db.session.commit()
+    assert client.oauth_client_id == "testclient-constant"
+
+    # every attempt collides with the existing client, the last error is re-raised
+    with pytest.raises(IntegrityError):
+        Client.create_new("Test Client", user.id)
+
+    # the failed attempts are rolled back to their savepoint, the session is usable
+    assert Client.query.count() == 1
+
+
+def test_create_new_random_skip_trashed_email(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    db.session.add(DeletedAlias(email="trashed@sl.local"))
+    db.session.commit()
+
+    emails = iter(["trashed@sl.local", "new@sl.local"])
+    monkeypatch.setattr(models, "generate_email", lambda **kwargs: next(emails))
+
+    alias = Alias.create_new_random(user)
+    assert alias.email == "new@sl.local"
+    assert not Alias.get_by(email="trashed@sl.local")
+
+
+def test_create_new_random_no_retry_on_other_error(flask_client, monkeypatch):
+    user = User.create(
+        email="a@b.c",
+        password="password",
+        name="Test User",
+        activated=True,
+        commit=True,
+    )
+    # mailbox_id is not nullable: this error isn't an email collision
+    user.default_mailbox_id = None
+    db.session.commit()
+
+    emails = []
+    generate_email = models.generate_email
+    monkeypatch.setattr(
+        models,
+        "generate_email",
+        lambda **kwargs: emails.append(generate_email(**kwargs)) or emails[-1],
+    )
+
+    with pytest.raises(IntegrityError):
+        Alias.create_new_random(user)
+
+    assert len(emails) == 1